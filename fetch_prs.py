@@ -4,18 +4,37 @@ Fetch PRs from microsoft/vscode and write to CSV.
 
 This script avoids GitHub Search's 1000-result cap by subdividing time ranges
 until each query returns fewer than 1000 results, then paginates those windows.
+Windows are fetched concurrently on a small thread pool.
 
 Output fields: number, title, created_at, merged_at, user.type, base.ref, comments, additions, deletions
+(title is left empty unless FETCH_TITLE=1 is set)
 """
 import os
 import json
 import re
 import csv
+import functools
+import math
+import queue
 import sys
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
-from github_api import run_graphql_query
+from github_api import (
+    RequestAborted,
+    StreamGraphQLError,
+    StreamInterrupted,
+    StreamUnavailable,
+    query_hash,
+    run_graphql_query,
+    stop_event,
+    stream_search,
+)
+
+load_dotenv()
 
 # Configuration
 OWNER = "microsoft"
@@ -23,16 +42,59 @@ REPO = "vscode"
 # Inclusive start date; modify if you want a different range
 START_DATE = "2020-01-01T00:00:00Z"
 OUTPUT_CSV = "vscode_prs.csv"
+# PR titles are the bulk of each response; only fetch them when asked to
+FETCH_TITLE = os.getenv("FETCH_TITLE", "0") == "1"
+# Number of time windows fetched concurrently
+MAX_WORKERS = 8
+# Results per page requested by QUERY
+PAGE_SIZE = 100
+# Expected results per window when splitting a window at the 1000-result cap
+SPLIT_TARGET = 900
+
+# Pages fetched between rate limit checks
+RATE_LIMIT_EVERY = 50
+# Queued windows whose first page is fetched together in one aliased request
+BATCH_SIZE = 5
+
+# Bound on rows waiting for the CSV writer thread
+ROW_QUEUE_SIZE = 50000
+
+# Guards the page counter and _boundary_numbers across worker threads
+_state_lock = threading.Lock()
+
+# Search date ranges are inclusive, so adjacent windows share their edge second.
+# PR numbers created within BOUNDARY_SLACK seconds of a window edge are
+# remembered (under _state_lock) to drop the duplicate copy.
+BOUNDARY_SLACK = timedelta(seconds=60)
+_boundary_numbers = set()
+
+# Numbering for save_invalid_response, initialized from the directory on first use
+_INVALID_RE = re.compile(r"invalid_response(\d{4})$")
+_next_invalid_index = None
+_invalid_lock = threading.Lock()
+
+# Fields written to the CSV, shared by QUERY and batch_query
+PR_FRAGMENT = """
+fragment PR on PullRequest {
+  number
+%s  createdAt
+  mergedAt
+  author {
+    __typename
+  }
+  baseRefName
+  comments {
+    totalCount
+  }
+  additions
+  deletions
+}
+""" % ("  title\n" if FETCH_TITLE else "")
 
-# GraphQL query for fetching PRs with pagination (includes issueCount)
+# GraphQL query for fetching PRs with pagination (includes issueCount).
+# rateLimit is left out to keep the per-page cost down; see RATE_LIMIT_QUERY.
 QUERY = """
 query($queryString: String!, $after: String) {
-  rateLimit {
-    limit
-    cost
-    remaining
-    resetAt
-  }
   search(query: $queryString, type: ISSUE, first: 100, after: $after) {
     issueCount
     pageInfo {
@@ -40,43 +102,76 @@ query($queryString: String!, $after: String) {
       endCursor
     }
     nodes {
-      ... on PullRequest {
-        number
-        title
-        createdAt
-        mergedAt
-        author {
-          __typename
-        }
-        baseRefName
-        comments {
-          totalCount
-        }
-        additions
-        deletions
-      }
+      ...PR
     }
   }
 }
+""" + PR_FRAGMENT
+
+
+@functools.lru_cache(maxsize=None)
+def batch_query(n):
+    """Return a query fetching page 1 of `n` searches, aliased w0..w{n-1}."""
+    params = ", ".join(f"$q{i}: String!" for i in range(n))
+    searches = "".join(
+        f"""
+  w{i}: search(query: $q{i}, type: ISSUE, first: 100) {{
+    issueCount
+    pageInfo {{
+      hasNextPage
+      endCursor
+    }}
+    nodes {{
+      ...PR
+    }}
+  }}"""
+        for i in range(n)
+    )
+    return f"query({params}) {{{searches}\n}}\n" + PR_FRAGMENT
+
+
+# Housekeeping query polled every RATE_LIMIT_EVERY pages
+RATE_LIMIT_QUERY = """
+query {
+  rateLimit {
+    limit
+    cost
+    remaining
+    resetAt
+  }
+}
 """
 
 
 def normalize_pr(pr_node):
-    return {
-        "number": pr_node.get("number"),
-        "title": pr_node.get("title"),
-        "created_at": pr_node.get("createdAt"),
-        "merged_at": pr_node.get("mergedAt"),
-        "user.type": (pr_node.get("author") or {}).get("__typename", "null"),
-        "base.ref": pr_node.get("baseRefName"),
-        "comments": pr_node.get("comments", {}).get("totalCount", 0),
-        "additions": pr_node.get("additions", 0),
-        "deletions": pr_node.get("deletions", 0),
-    }
+    """Return the CSV row for `pr_node`, in the column order written by main."""
+    # bind .get once; this runs for every PR
+    get = pr_node.get
+    author = get("author")
+    comments = get("comments")
+    return (
+        get("number"),
+        get("title", ""),
+        get("createdAt"),
+        get("mergedAt"),
+        author.get("__typename", "null") if author else "null",
+        get("baseRefName"),
+        comments.get("totalCount", 0) if comments else 0,
+        get("additions", 0),
+        get("deletions", 0),
+    )
 
 
 def iso_z(dt):
-    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    # plain formatting; strftime re-parses its format string on every call
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}T{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}Z"
+
+
+def split_range(start_dt, end_dt, parts):
+    """Split [start_dt, end_dt) into `parts` contiguous windows of equal width."""
+    step = (end_dt - start_dt) / parts
+    bounds = [start_dt + step * i for i in range(parts)] + [end_dt]
+    return list(zip(bounds[:-1], bounds[1:]))
 
 
 def safe_run_query(query, variables, token, max_retries=1):
@@ -84,18 +179,17 @@ def safe_run_query(query, variables, token, max_retries=1):
 
     Returns the response dict or None if still invalid after retries.
     """
-    import time
-
     last_resp = None
     for attempt in range(max_retries + 1):
-        resp = run_graphql_query(query, variables, token)
+        resp = run_graphql_query(query, variables, token, query_sha256=query_hash(query))
         last_resp = resp
         if isinstance(resp, dict):
             return resp
         if attempt < max_retries:
             wait = 2 ** attempt
             print(f"[WARN] Invalid API response (attempt {attempt+1}/{max_retries+1}). Retrying in {wait}s...")
-            time.sleep(wait)
+            if stop_event.wait(wait):
+                raise RequestAborted("Stop requested")
 
     # persist raw invalid response to disk for debugging
     try:
@@ -113,21 +207,22 @@ def save_invalid_response(resp):
     contain the text 'None'. For dict-like objects we write pretty JSON; for
     others we write str(resp).
     """
+    global _next_invalid_index
+
     base = os.path.dirname(__file__) or "."
-    names = [n for n in os.listdir(base) if n.startswith("invalid_response")]
-    max_index = 0
-    pat = re.compile(r"invalid_response(\d{4})$")
-    for n in names:
-        m = pat.match(n)
-        if m:
-            try:
-                idx = int(m.group(1))
-                if idx > max_index:
-                    max_index = idx
-            except Exception:
-                continue
+    with _invalid_lock:
+        if _next_invalid_index is None:
+            # scan the directory once; later saves just bump the counter
+            max_index = 0
+            with os.scandir(base) as entries:
+                for entry in entries:
+                    m = _INVALID_RE.match(entry.name)
+                    if m:
+                        max_index = max(max_index, int(m.group(1)))
+            _next_invalid_index = max_index + 1
+        next_index = _next_invalid_index
+        _next_invalid_index += 1
 
-    next_index = max_index + 1
     filename = f"invalid_response{next_index:04d}"
     path = os.path.join(base, filename)
 
@@ -143,46 +238,145 @@ def save_invalid_response(resp):
         fh.write(body)
 
 
-def fetch_range_and_write(start_dt, end_dt, writer, token, totals):
+def search_query_string(start_iso, end_iso):
+    return f"repo:{OWNER}/{REPO} is:pr created:{start_iso}..{end_iso}"
+
+
+def run_query_checked(query, variables, token):
+    """Run `query` via safe_run_query and return its `data`, or None if the response was invalid.
+
+    GraphQL errors in the response are fatal.
     """
-    For a given time window [start_dt, end_dt), page through results and write to CSV.
-    Returns number written.
+    resp = safe_run_query(query, variables, token, max_retries=1)
+    if resp is None:
+        return None
+
+    if "errors" in resp:
+        exit_on_graphql_errors(resp["errors"])
+
+    return resp.get("data") or {}
+
+
+def exit_on_graphql_errors(errors):
+    """Print the GraphQL `errors` of a response and exit."""
+    print("ERROR: GraphQL errors in response:")
+    for error in errors:
+        print(f"  - {error.get('message')}")
+    raise SystemExit(1)
+
+
+def log_rate_limit(token):
+    """Fetch and print the current GraphQL rate limit status."""
+    resp = safe_run_query(RATE_LIMIT_QUERY, {}, token, max_retries=1)
+    if resp is None or "errors" in resp:
+        print("[WARN] Could not fetch rate limit status.")
+        return
+    rate_limit = (resp.get("data") or {}).get("rateLimit") or {}
+    print(
+        f"[Rate Limit] {rate_limit.get('remaining')}/{rate_limit.get('limit')} remaining "
+        f"(resets at {rate_limit.get('resetAt')})"
+    )
+
+
+def plan_split(start_dt, end_dt, start_iso, end_iso, issue_count):
     """
-    written = 0
-    start_iso = iso_z(start_dt)
-    end_iso = iso_z(end_dt)
-    query_string = f"repo:{OWNER}/{REPO} is:pr created:{start_iso}..{end_iso}"
+    Decide how to split [start_dt, end_dt) given its issueCount.
 
-    after_cursor = None
-    page = 0
-    while True:
-        page += 1
-        print(f"[Range {start_iso} -> {end_iso}] Page {page} (after={after_cursor[:20] if after_cursor else 'None'})")
-        variables = {"queryString": query_string, "after": after_cursor}
-        resp = safe_run_query(QUERY, variables, token, max_retries=1)
+    `start_iso`/`end_iso` are the window bounds already formatted by the caller.
 
-        # If we still get an invalid response after retry, skip remaining pages of this range
-        if resp is None:
-            print(f"[WARN] Invalid API response for range {start_iso} -> {end_iso}; skipping remaining pages of this range.")
-            return written
+    Windows at the 1000-result cap are split into ceil(issueCount / SPLIT_TARGET)
+    pieces that are checked again; windows spanning several pages are split
+    into one sub-window per page so the pages can be fetched concurrently.
+    Returns the list of (start, end, split) sub-windows, empty if the window
+    should be paginated as is.
+    """
+    duration = (end_dt - start_dt)
+    seconds = int(duration.total_seconds())
+
+    # GitHub search caps results at 1000; subdivide if at or above cap
+    if issue_count >= 1000:
+        # if the range is already very small, still attempt to paginate to avoid infinite split
+        if duration <= timedelta(seconds=1):
+            print("[Warning] Range is <=1s but >=1000 results — paginating anyway.")
+            return []
+        # split once into enough equal pieces to bring each under the cap, but
+        # always at least in two so every split shrinks the window toward the
+        # <=1s guard above (the seconds cap alone gives 1 for windows under 2s)
+        n_splits = max(2, min(math.ceil(issue_count / SPLIT_TARGET), seconds))
+        print(f"[Split] Too many results; splitting {start_iso}..{end_iso} into {n_splits} windows")
+        return [(a, b, True) for a, b in split_range(start_dt, end_dt, n_splits)]
+
+    # Cursors can only be followed sequentially, so split multi-page windows
+    # by time instead and fetch one page-sized window per worker
+    pages = min(math.ceil(issue_count / PAGE_SIZE), seconds)
+    if pages > 1:
+        print(f"[Split] {issue_count} results span {pages} pages; fetching {pages} sub-windows concurrently")
+        return [(a, b, False) for a, b in split_range(start_dt, end_dt, pages)]
+
+    return []
+
+
+def queue_split(start_dt, end_dt, start_iso, end_iso, search, ranges):
+    """Append the sub-windows plan_split picks for this page-1 `search` to `ranges`.
+
+    Returns True if the window was split.
+    """
+    issue_count = search.get("issueCount", 0)
+    print(f"[Range Count] {issue_count} matching PRs in this window")
+    sub_ranges = plan_split(start_dt, end_dt, start_iso, end_iso, issue_count)
+    ranges.extend(sub_ranges)
+    return bool(sub_ranges)
 
-        if "errors" in resp:
-            print("ERROR: GraphQL errors in response:")
-            for error in resp["errors"]:
-                print(f"  - {error.get('message')}")
-            raise SystemExit(1)
 
-        data = resp.get("data", {})
-        rate_limit = data.get("rateLimit", {})
-        search = data.get("search", {})
-        nodes = search.get("nodes", [])
-        page_info = search.get("pageInfo", {})
+def boundary_bands(start_dt, end_dt):
+    """Return the (low, high) createdAt ISO strings within BOUNDARY_SLACK of each window edge."""
+    return tuple(
+        (iso_z(edge - BOUNDARY_SLACK), iso_z(edge + BOUNDARY_SLACK))
+        for edge in (start_dt, end_dt)
+    )
+
 
-        remaining = rate_limit.get("remaining")
-        print(f"[Rate Limit] {remaining} remaining (cost: {rate_limit.get('cost')})")
-        print(f"[Fetched] {len(nodes)} PRs on this page")
+def csv_writer_thread(row_queue, writer, totals):
+    """Write rows from `row_queue` to the CSV until a None sentinel arrives.
 
+    Runs on its own thread so row formatting and file writes overlap with the
+    workers' network waits; it is the only code touching `writer`.
+    """
+    while True:
+        row = row_queue.get()
+        if row is None:
+            break
+        try:
+            writer.writerow(row)
+        except Exception as e:
+            print(f"[WARN] Failed to write PR row: {e}")
+            try:
+                save_invalid_response(row)
+            except Exception:
+                pass
+            continue
+        totals["count"] += 1
+
+
+def write_nodes(nodes, row_queue, bands, skip=0):
+    """
+    Queue the CSV rows for PR `nodes` (a list, or a stream from stream_search).
+
+    PRs created inside `bands` (from boundary_bands) are skipped if an
+    adjacent window already wrote them. ISO 8601 UTC strings sort like the
+    times they represent, so createdAt is compared without parsing.
+    The first `skip` nodes are ignored (already handled by an earlier,
+    interrupted read of the same page).
+    Returns (written, consumed, interrupted); `consumed` counts the nodes
+    read, and `interrupted` is True if a streamed response failed part-way.
+    """
+    written = 0
+    consumed = 0
+    try:
         for pr in nodes:
+            consumed += 1
+            if consumed <= skip:
+                continue
             if not isinstance(pr, dict):
                 print(f"[WARN] Skipping unexpected node (not a dict): {pr!r}")
                 try:
@@ -190,8 +384,14 @@ def fetch_range_and_write(start_dt, end_dt, writer, token, totals):
                 except Exception:
                     pass
                 continue
+            created = pr.get("createdAt") or ""
+            if any(low <= created <= high for low, high in bands):
+                with _state_lock:
+                    if pr.get("number") in _boundary_numbers:
+                        continue
+                    _boundary_numbers.add(pr.get("number"))
             try:
-                writer.writerow(normalize_pr(pr))
+                row = normalize_pr(pr)
             except Exception as e:
                 print(f"[WARN] Failed to write PR row: {e}")
                 try:
@@ -199,18 +399,131 @@ def fetch_range_and_write(start_dt, end_dt, writer, token, totals):
                 except Exception:
                     pass
                 continue
+            row_queue.put(row)
             written += 1
-            totals["count"] += 1
+    except StreamInterrupted as e:
+        print(f"[WARN] Response stream interrupted: {e}")
+        return written, consumed, True
+    return written, consumed, False
 
+
+def fetch_range_and_write(start_dt, end_dt, row_queue, token, totals, ranges, split=True, first_page=None, isos=None):
+    """
+    For a given time window [start_dt, end_dt), page through results and queue
+    their CSV rows on `row_queue`.
+
+    Pages are streamed with stream_search so only one PR node is held in memory
+    at a time, falling back to safe_run_query when the response can't be streamed.
+    A page whose stream breaks part-way is refetched in full, skipping the
+    nodes already read.
+    If `first_page` is given (a `search` result already fetched by
+    fetch_batch_and_write), it is used as page 1; `isos` likewise passes the
+    (start_iso, end_iso) it already formatted.
+    Page 1 carries the window's issueCount. If `split` is set and plan_split
+    decides to subdivide the window, page 1 is discarded and the sub-windows
+    are appended to `ranges` instead; they cover the same results, so writing
+    page 1 would duplicate rows.
+    Returns number written.
+    """
+    written = 0
+    start_iso, end_iso = isos or (iso_z(start_dt), iso_z(end_dt))
+    print(f"\n[Range] Processing {start_iso} -> {end_iso}")
+    query_string = search_query_string(start_iso, end_iso)
+    bands = boundary_bands(start_dt, end_dt)
+
+    after_cursor = None
+    page = 0
+    while True:
+        if stop_event.is_set():
+            print(f"[Stopped] Abandoning range {start_iso} -> {end_iso} after {written} PRs")
+            return written
+        page += 1
+        print(f"[Range {start_iso} -> {end_iso}] Page {page} (after={after_cursor[:20] if after_cursor else 'None'})")
+        variables = {"queryString": query_string, "after": after_cursor}
+
+        search = first_page if page == 1 else None
+        streamed = False
+        if search is None:
+            try:
+                with stream_search(QUERY, variables, token, query_sha256=query_hash(QUERY)) as (search, nodes):
+                    if page == 1 and split and queue_split(start_dt, end_dt, start_iso, end_iso, search, ranges):
+                        return written
+                    page_written, consumed, interrupted = write_nodes(nodes, row_queue, bands)
+                streamed = True
+            except StreamGraphQLError as e:
+                exit_on_graphql_errors(e.errors)
+            except StreamUnavailable:
+                data = run_query_checked(QUERY, variables, token)
+
+                # If we still get an invalid response after retry, skip remaining pages of this range
+                if data is None:
+                    print(f"[WARN] Invalid API response for range {start_iso} -> {end_iso}; skipping remaining pages of this range.")
+                    return written
+                search = data.get("search") or {}
+
+        if not streamed:
+            if page == 1 and split and queue_split(start_dt, end_dt, start_iso, end_iso, search, ranges):
+                return written
+            page_written, consumed, interrupted = write_nodes(search.get("nodes") or [], row_queue, bands)
+
+        if interrupted:
+            # Refetch the whole page and skip the nodes already consumed
+            print(f"[Retry] Refetching page {page} after {consumed} nodes")
+            data = run_query_checked(QUERY, variables, token)
+            if data is None:
+                written += page_written
+                print(f"[WARN] Incomplete page for range {start_iso} -> {end_iso}; skipping remaining pages of this range.")
+                return written
+            search = data.get("search") or {}
+            rest_written, _, _ = write_nodes(search.get("nodes") or [], row_queue, bands, skip=consumed)
+            page_written += rest_written
+
+        written += page_written
+        print(f"[Fetched] {page_written} PRs on this page")
+
+        with _state_lock:
+            totals["pages"] += 1
+            check_rate = totals["pages"] % RATE_LIMIT_EVERY == 0
+        if check_rate:
+            log_rate_limit(token)
+
+        page_info = search.get("pageInfo", {})
         if not page_info.get("hasNextPage", False):
             break
         after_cursor = page_info.get("endCursor")
 
+    print(f"[Done Range] Wrote {written} PRs for {start_iso} -> {end_iso}")
+    return written
+
+
+def fetch_batch_and_write(windows, row_queue, token, totals, ranges):
+    """
+    Fetch page 1 of several page-sized (start, end, split=False) windows in one
+    aliased request.
+
+    Each window is then handled by fetch_range_and_write with its page 1
+    already in hand, so splitting and any further pages work as usual.
+    Returns number written.
+    """
+    if stop_event.is_set():
+        return 0
+    window_isos = [(iso_z(s), iso_z(e)) for s, e, _ in windows]
+    variables = {f"q{i}": search_query_string(*isos) for i, isos in enumerate(window_isos)}
+    print(f"[Batch] Fetching page 1 of {len(windows)} windows in one request")
+    data = run_query_checked(batch_query(len(windows)), variables, token)
+
+    written = 0
+    for i, (s, e, split) in enumerate(windows):
+        # On an invalid batch response or a missing alias, fall back to
+        # fetching the window itself
+        first_page = data.get(f"w{i}") if data is not None else None
+        written += fetch_range_and_write(
+            s, e, row_queue, token, totals, ranges, split, first_page=first_page, isos=window_isos[i]
+        )
     return written
 
 
 def main():
-    load_dotenv()
     token = os.getenv("GITHUB_TOKEN")
     if not token:
         print("ERROR: GITHUB_TOKEN environment variable not set.")
@@ -218,7 +531,7 @@ def main():
         sys.exit(1)
 
     # prepare CSV
-    csv_file = open(OUTPUT_CSV, "w", newline="", encoding="utf-8")
+    csv_file = open(OUTPUT_CSV, "w", newline="", encoding="utf-8", buffering=1 << 20)
     fieldnames = [
         "number",
         "title",
@@ -230,8 +543,8 @@ def main():
         "additions",
         "deletions",
     ]
-    writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-    writer.writeheader()
+    writer = csv.writer(csv_file)
+    writer.writerow(fieldnames)
 
     # convert START_DATE to datetime
     try:
@@ -242,57 +555,45 @@ def main():
 
     end_dt = datetime.utcnow()
 
-    # stack of ranges to process (start inclusive, end exclusive)
-    ranges = [(start_dt, end_dt)]
-    totals = {"count": 0}
-
-    try:
-        while ranges:
-            s, e = ranges.pop(0)
-            if s >= e:
-                continue
-
-            s_iso = iso_z(s)
-            e_iso = iso_z(e)
-            print(f"\n[Range] Processing {s_iso} -> {e_iso}")
-
-            # quick check of issueCount for this range
-            qs = f"repo:{OWNER}/{REPO} is:pr created:{s_iso}..{e_iso}"
-            variables = {"queryString": qs, "after": None}
-            resp = safe_run_query(QUERY, variables, token, max_retries=1)
+    # queue of ranges to process (start inclusive, end exclusive, may split);
+    # workers append the sub-windows of any range they split. A deque makes
+    # popleft O(1) and its append/popleft are safe across threads.
+    ranges = deque([(start_dt, end_dt, True)])
+    totals = {"count": 0, "pages": 0}
 
-            if resp is None:
-                print(f"[WARN] Invalid API response during count check for {s_iso} -> {e_iso}; skipping this range.")
-                continue
+    # workers queue rows; a single thread owns the CSV writer
+    row_queue = queue.Queue(maxsize=ROW_QUEUE_SIZE)
+    writer_thread = threading.Thread(target=csv_writer_thread, args=(row_queue, writer, totals), daemon=True)
+    writer_thread.start()
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    pending = set()
 
-            if "errors" in resp:
-                print("ERROR: GraphQL errors in response (during count check):")
-                for error in resp["errors"]:
-                    print(f"  - {error.get('message')}")
-                raise SystemExit(1)
-
-            data = resp.get("data", {})
-            search = data.get("search", {})
-            issue_count = search.get("issueCount", 0)
-            print(f"[Range Count] {issue_count} matching PRs in this window")
-
-            # GitHub search caps results at 1000; subdivide if at or above cap
-            if issue_count >= 1000:
-                # if the range is already very small, still attempt to paginate to avoid infinite split
-                duration = (e - s)
-                if duration <= timedelta(seconds=1):
-                    print("[Warning] Range is <=1s but >=1000 results — paginating anyway.")
-                    fetch_range_and_write(s, e, writer, token, totals)
+    try:
+        while ranges or pending:
+            # keep at most MAX_WORKERS jobs in flight; when page-sized windows
+            # are queued up, fetch the first page of up to BATCH_SIZE of them
+            # per request. Windows that may still split are streamed on their
+            # own so a discarded page 1 is closed early instead of downloaded.
+            while ranges and len(pending) < MAX_WORKERS:
+                # spread the queue over idle workers before batching
+                batch_size = min(BATCH_SIZE, math.ceil(len(ranges) / (MAX_WORKERS - len(pending))))
+                s, e, split = ranges.popleft()
+                if s >= e:
+                    continue
+                batch = [(s, e, split)]
+                while not split and ranges and len(batch) < batch_size and not ranges[0][2]:
+                    s, e, _ = ranges.popleft()
+                    if s < e:
+                        batch.append((s, e, False))
+                if len(batch) == 1:
+                    s, e, split = batch[0]
+                    pending.add(pool.submit(fetch_range_and_write, s, e, row_queue, token, totals, ranges, split))
                 else:
-                    mid = s + (e - s) / 2
-                    print(f"[Split] Too many results; splitting into {iso_z(s)}..{iso_z(mid)} and {iso_z(mid)}..{iso_z(e)}")
-                    # Push the second half first so we process the earlier half next (keeps ordering)
-                    ranges.insert(0, (mid, e))
-                    ranges.insert(0, (s, mid))
-            else:
-                # Safe to fetch this range fully (may still page)
-                written = fetch_range_and_write(s, e, writer, token, totals)
-                print(f"[Done Range] Wrote {written} PRs for {s_iso} -> {e_iso}")
+                    pending.add(pool.submit(fetch_batch_and_write, batch, row_queue, token, totals, ranges))
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                fut.result()
 
     except KeyboardInterrupt:
         print("\n[Interrupted] Exiting gracefully...")
@@ -300,6 +601,11 @@ def main():
         print(f"\n[ERROR] {exc}")
         sys.exit(1)
     finally:
+        # stop workers between pages or mid-wait, then flush their rows
+        stop_event.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+        row_queue.put(None)
+        writer_thread.join()
         csv_file.close()
         print(f"\n[Summary] Wrote {totals['count']} PRs to {OUTPUT_CSV}")
 
@@ -1,11 +1,199 @@
 """
 Lightweight GitHub GraphQL API wrapper with retry and rate limit handling.
 """
+import contextlib
+import functools
+import hashlib
+import json
+import random
+import threading
 import time
-import requests
 
+import httpx
 
-def run_graphql_query(query, variables, token):
+try:
+    import orjson
+except ImportError:  # optional, faster JSON encoding/decoding
+    orjson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+else:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+try:
+    import ijson
+except ImportError:  # optional, streaming response parsing
+    ijson = None
+
+try:
+    import brotli  # noqa: F401  (lets httpx decode "br" responses)
+except ImportError:  # optional, better compression than gzip
+    brotli = None
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+# Search pages repeat the same keys for every node, so they compress well
+ACCEPT_ENCODING = "br, gzip, deflate" if brotli is not None else "gzip, deflate"
+JSON_HEADERS = {
+    "Content-Type": "application/json",
+}
+
+# One long-lived HTTP/2 client per token, so every request reuses the same
+# TLS connection instead of paying a handshake per call
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Set to abandon requests that are waiting to retry, e.g. on shutdown
+stop_event = threading.Event()
+
+# Cleared the first time the server rejects a hash-only request for a reason
+# other than an unknown hash, i.e. it does not implement persisted queries.
+_persisted_queries_enabled = True
+
+
+@functools.lru_cache(maxsize=None)
+def query_hash(query):
+    """Return the SHA-256 hex digest identifying `query` as a persisted query."""
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def _get_client(token):
+    """Return the shared HTTP/2 client for `token`, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = httpx.Client(
+                http2=True,
+                timeout=30,
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Accept-Encoding": ACCEPT_ENCODING,
+                },
+                limits=httpx.Limits(max_keepalive_connections=16),
+            )
+            _clients[token] = client
+        return client
+
+
+class RequestAborted(Exception):
+    """stop_event was set while a request was waiting to retry."""
+
+
+class StreamUnavailable(Exception):
+    """The response could not be streamed; nothing was consumed, so it is safe to refetch."""
+
+
+class StreamInterrupted(Exception):
+    """A streamed response failed after some of its nodes had been yielded."""
+
+
+class StreamGraphQLError(Exception):
+    """A streamed response carried GraphQL `errors` after its search nodes."""
+
+    def __init__(self, errors):
+        super().__init__("GraphQL errors in response")
+        self.errors = errors
+
+
+class _ChunkReader:
+    """Minimal file-like view over an iterator of byte chunks, for ijson."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _build_payload(query, variables, query_sha256=None, register=False):
+    """Return the request body, sending only the hash when `query_sha256` is set."""
+    payload = {"variables": variables}
+    if query_sha256 is None or register:
+        payload["query"] = query
+    if query_sha256 is not None:
+        payload["extensions"] = {
+            "persistedQuery": {"version": 1, "sha256Hash": query_sha256}
+        }
+    return payload
+
+
+def _warn_rate_limit(response):
+    """Print a warning when the X-RateLimit-Remaining header runs low."""
+    if "X-RateLimit-Remaining" in response.headers:
+        remaining = int(response.headers["X-RateLimit-Remaining"])
+        if remaining < 100:
+            print(
+                f"[WARN] Rate limit low ({remaining} remaining). "
+                "Consider slowing requests."
+            )
+
+
+def _sleep(seconds):
+    """Wait `seconds`, raising RequestAborted as soon as stop_event is set."""
+    if stop_event.wait(seconds):
+        raise RequestAborted("Stop requested")
+
+
+def _backoff_delay(backoff_factor, attempt):
+    """Exponential backoff with full jitter, so concurrent workers don't retry in lockstep."""
+    return random.uniform(0, backoff_factor ** (attempt - 1))
+
+
+def _rate_limited_wait(response):
+    """
+    Return the seconds to wait before retrying a rate-limited 403/429 response.
+
+    Secondary rate limits carry a Retry-After header; an exhausted primary
+    limit has X-RateLimit-Remaining: 0 and an X-RateLimit-Reset epoch. Returns
+    None if the response does not look rate limited (e.g. a plain 403).
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return int(retry_after)
+        except ValueError:
+            return 60
+    if response.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in response.headers:
+        return max(1, int(response.headers["X-RateLimit-Reset"]) - time.time())
+    if b"rate limit" in response.content.lower():
+        # GitHub asks for at least a minute when no header says otherwise
+        return 60
+    return None
+
+
+def _persisted_query_error(data):
+    """
+    Return the error code if `data` is a rejected hash-only request, else None.
+
+    Servers implementing automatic persisted queries answer an unknown hash with
+    PERSISTED_QUERY_NOT_FOUND; servers without support reject the missing query
+    body with some other error and no data.
+    """
+    if not isinstance(data, dict) or not data.get("errors") or data.get("data"):
+        return None
+    if any("rate limit" in str(e.get("message", "")) for e in data["errors"]):
+        return None
+    for error in data["errors"]:
+        code = (error.get("extensions") or {}).get("code")
+        if code == "PERSISTED_QUERY_NOT_FOUND":
+            return code
+    return "PERSISTED_QUERY_NOT_SUPPORTED"
+
+
+def run_graphql_query(query, variables, token, query_sha256=None):
     """
     Execute a GraphQL query against GitHub's API with retry logic.
 
@@ -13,53 +201,91 @@ def run_graphql_query(query, variables, token):
         query (str): GraphQL query string
         variables (dict): Variables for the query
         token (str): GitHub personal access token
+        query_sha256 (str): Optional query_hash(query); when given, only the
+            hash is sent and the full query is used as a fallback
 
     Returns:
         dict: Parsed JSON response or raises Exception on final retry failure
 
     Handles:
         - Rate limit exhaustion (sleeps until resetAt)
-        - 502/503 errors and timeouts (exponential backoff)
+        - Secondary rate limits, HTTP 403/429 (sleeps for Retry-After)
+        - 502/503 errors and timeouts (exponential backoff with jitter)
         - Up to 5 retry attempts total
+        - Persisted query misses (resends the full query body)
+
+    Waits raise RequestAborted as soon as stop_event is set.
     """
-    url = "https://api.github.com/graphql"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
+    global _persisted_queries_enabled
+
+    client = _get_client(token)
 
     max_retries = 5
-    backoff_factor = 2  # Exponential backoff: 1s, 2s, 4s, 8s, 16s
+    backoff_factor = 2  # Exponential backoff caps: 1s, 2s, 4s, 8s, 16s (jittered)
+    persisted = query_sha256 is not None and _persisted_queries_enabled
+    register = False  # send the full body alongside the hash so the server caches it
 
     for attempt in range(1, max_retries + 1):
+        payload = _build_payload(
+            query, variables, query_sha256 if persisted else None, register
+        )
+
         try:
-            response = requests.post(
-                url,
-                json={"query": query, "variables": variables},
-                headers=headers,
-                timeout=30,
+            response = client.post(
+                GRAPHQL_URL,
+                content=_dumps(payload),
+                headers=JSON_HEADERS,
             )
 
             # Check for rate limiting in response headers
-            if "X-RateLimit-Remaining" in response.headers:
-                remaining = int(response.headers["X-RateLimit-Remaining"])
-                if remaining < 100:
+            _warn_rate_limit(response)
+
+            # Secondary (or exhausted primary) rate limit: honor Retry-After
+            if response.status_code in (403, 429) and attempt < max_retries:
+                wait_time = _rate_limited_wait(response)
+                if wait_time is not None:
+                    wait_time += random.uniform(0, 1)
                     print(
-                        f"[WARN] Rate limit low ({remaining} remaining). "
-                        "Consider slowing requests."
+                        f"[RATE LIMIT] HTTP {response.status_code}. "
+                        f"Sleeping {wait_time:.0f}s..."
                     )
+                    _sleep(wait_time)
+                    continue
 
             # Parse response
-            data = response.json()
+            data = _loads(response.content)
+
+            # Unknown or unsupported persisted query: resend with the full body
+            if persisted and not register:
+                code = _persisted_query_error(data)
+                if code == "PERSISTED_QUERY_NOT_FOUND":
+                    register = True
+                    continue
+                if code:
+                    print("[INFO] Persisted queries not supported; sending full queries.")
+                    _persisted_queries_enabled = False
+                    persisted = False
+                    continue
 
             # Check for rate limit error in GraphQL response
             if "errors" in data:
                 errors = data.get("errors", [])
+                rate_limited = False
                 for error in errors:
-                    if "API rate limit exceeded" in str(error.get("message", "")):
-                        # Extract resetAt from rateLimit node if available
-                        rate_limit_info = data.get("data", {}).get("rateLimit", {})
+                    if (
+                        error.get("type") == "RATE_LIMITED"
+                        or "API rate limit exceeded" in str(error.get("message", ""))
+                    ):
+                        rate_limited = True
+                        # Extract resetAt from rateLimit node if the query
+                        # selected it, else from the X-RateLimit-Reset header
+                        rate_limit_info = (data.get("data") or {}).get("rateLimit") or {}
                         reset_at = rate_limit_info.get("resetAt")
+                        if not reset_at and "X-RateLimit-Reset" in response.headers:
+                            reset_at = time.strftime(
+                                "%Y-%m-%dT%H:%M:%SZ",
+                                time.gmtime(int(response.headers["X-RateLimit-Reset"])),
+                            )
                         if reset_at:
                             # Parse ISO 8601 timestamp and calculate sleep time
                             import datetime
@@ -74,13 +300,15 @@ def run_graphql_query(query, variables, token):
                                 f"[RATE LIMIT] Sleeping {sleep_seconds:.0f}s "
                                 f"until {reset_at}"
                             )
-                            time.sleep(sleep_seconds)
-                            continue
+                            _sleep(sleep_seconds)
                         else:
                             # Fallback: wait 60 seconds
                             print("[RATE LIMIT] No resetAt. Sleeping 60s...")
-                            time.sleep(60)
-                            continue
+                            _sleep(60)
+                        break
+                # Retry the request now that the limit has reset
+                if rate_limited:
+                    continue
 
             # Success or other GraphQL error
             if response.status_code == 200:
@@ -89,12 +317,12 @@ def run_graphql_query(query, variables, token):
             # HTTP errors (non-200)
             if response.status_code in (502, 503):
                 if attempt < max_retries:
-                    wait_time = backoff_factor ** (attempt - 1)
+                    wait_time = _backoff_delay(backoff_factor, attempt)
                     print(
                         f"[RETRY {attempt}/{max_retries}] HTTP {response.status_code} "
-                        f"error. Waiting {wait_time}s..."
+                        f"error. Waiting {wait_time:.1f}s..."
                     )
-                    time.sleep(wait_time)
+                    _sleep(wait_time)
                     continue
                 else:
                     raise Exception(
@@ -106,28 +334,126 @@ def run_graphql_query(query, variables, token):
                 f"HTTP {response.status_code}: {response.text[:200]}"
             )
 
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             if attempt < max_retries:
-                wait_time = backoff_factor ** (attempt - 1)
+                wait_time = _backoff_delay(backoff_factor, attempt)
                 print(
                     f"[RETRY {attempt}/{max_retries}] Timeout. "
-                    f"Waiting {wait_time}s..."
+                    f"Waiting {wait_time:.1f}s..."
                 )
-                time.sleep(wait_time)
+                _sleep(wait_time)
                 continue
             else:
                 raise Exception(f"Timeout after {max_retries} retries")
 
-        except requests.exceptions.RequestException as e:
+        except ValueError as e:
+            # Non-JSON body (e.g. an HTML error page from a proxy)
+            if attempt < max_retries:
+                wait_time = _backoff_delay(backoff_factor, attempt)
+                print(
+                    f"[RETRY {attempt}/{max_retries}] Invalid JSON response: {e}. "
+                    f"Waiting {wait_time:.1f}s..."
+                )
+                _sleep(wait_time)
+                continue
+            else:
+                raise Exception(f"Invalid JSON after {max_retries} retries: {e}")
+
+        except httpx.RequestError as e:
             if attempt < max_retries:
-                wait_time = backoff_factor ** (attempt - 1)
+                wait_time = _backoff_delay(backoff_factor, attempt)
                 print(
                     f"[RETRY {attempt}/{max_retries}] Request error: {e}. "
-                    f"Waiting {wait_time}s..."
+                    f"Waiting {wait_time:.1f}s..."
                 )
-                time.sleep(wait_time)
+                _sleep(wait_time)
                 continue
             else:
                 raise Exception(f"Request failed after {max_retries} retries: {e}")
 
     raise Exception("Max retries exceeded (no successful response)")
+
+
+def _iter_nodes(events):
+    """
+    Yield the search nodes remaining in the ijson `events` stream.
+
+    The rest of the response is read once the nodes are exhausted, and a
+    top-level `errors` array found there raises StreamGraphQLError.
+    """
+    errors = []
+
+    def watch():
+        for prefix, event, value in events:
+            if prefix == "errors.item" and event == "start_map":
+                errors.append({})
+            elif prefix == "errors.item.message":
+                errors[-1]["message"] = value
+            yield prefix, event, value
+
+    try:
+        yield from ijson.items(watch(), "data.search.nodes.item")
+    except (httpx.HTTPError, ijson.JSONError) as e:
+        raise StreamInterrupted(str(e)) from e
+    if errors:
+        raise StreamGraphQLError(errors)
+
+
+@contextlib.contextmanager
+def stream_search(query, variables, token, query_sha256=None):
+    """
+    Execute a `search` query and stream its nodes instead of parsing the whole response.
+
+    Yields (search, nodes): `search` holds the scalar fields selected before
+    `nodes` (e.g. issueCount, pageInfo) and `nodes` lazily yields one node
+    dict at a time. GraphQL returns fields in selection order, so `nodes`
+    must be selected last. Leaving the block early closes the response
+    without downloading the rest.
+
+    Raises StreamUnavailable, before anything is yielded, if ijson is not
+    installed or the response is not a successful search page (HTTP error,
+    GraphQL errors, transport failure); callers should fall back to
+    run_graphql_query, which handles retries and rate limits. Failures while
+    iterating `nodes` raise StreamInterrupted; GraphQL errors sent after the
+    nodes raise StreamGraphQLError once they are exhausted (not if the block
+    is left early).
+    """
+    if ijson is None:
+        raise StreamUnavailable("ijson is not installed")
+
+    persisted = query_sha256 is not None and _persisted_queries_enabled
+    payload = _build_payload(query, variables, query_sha256 if persisted else None)
+
+    with contextlib.ExitStack() as stack:
+        try:
+            response = stack.enter_context(
+                _get_client(token).stream(
+                    "POST",
+                    GRAPHQL_URL,
+                    content=_dumps(payload),
+                    headers=JSON_HEADERS,
+                )
+            )
+            if response.status_code != 200:
+                raise StreamUnavailable(f"HTTP {response.status_code}")
+            _warn_rate_limit(response)
+
+            events = ijson.parse(_ChunkReader(response.iter_bytes()))
+            search = {}
+            for prefix, event, value in events:
+                if prefix == "errors":
+                    raise StreamUnavailable("GraphQL errors in response")
+                if prefix == "data.search.nodes":
+                    break
+                if event in ("string", "number", "boolean", "null") and prefix.startswith("data.search."):
+                    *parents, key = prefix[len("data.search."):].split(".")
+                    target = search
+                    for parent in parents:
+                        target = target.setdefault(parent, {})
+                    target[key] = value
+            else:
+                raise StreamUnavailable("No search nodes in response")
+        except (httpx.HTTPError, ijson.JSONError) as e:
+            raise StreamUnavailable(str(e)) from e
+
+        yield search, _iter_nodes(events)